@@ -0,0 +1,64 @@
+"""
+Offline build step that exports both YOLO models to INT8 (or FP16) inference engines.
+
+Run this once on the deployment host (engines are tied to the GPU / TensorRT version they
+were built with) before starting the API:
+
+    python export_models.py                   # TensorRT on GPU hosts, OpenVINO on CPU-only hosts
+    python export_models.py --format openvino # force the OpenVINO export
+    python export_models.py --half            # FP16 instead of INT8, no calibration set needed
+
+The INT8 calibration images are configured in calib.yaml.
+"""
+import argparse
+import os
+
+import torch
+from ultralytics import YOLO
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Source checkpoints that get exported next to themselves (best.engine, yolov8s.engine, ...)
+MODEL_PATHS = [
+    os.path.join(BASE_DIR, "custom_model", "best.pt"),
+    os.path.join(BASE_DIR, "yolov8s.pt"),
+]
+CALIB_DATA = os.path.join(BASE_DIR, "calib.yaml")
+# Largest batch the exported engines accept. Must be >= max_batch_size in main.py, otherwise
+# coalesced request batches from the API's BatchInferencer will not fit the engine.
+MAX_BATCH = 16
+
+
+def export_model(model_path: str, export_format: str, half: bool = False) -> str:
+    """ Export a single checkpoint to an INT8 (or FP16) engine and return the path of the exported artifact."""
+    model = YOLO(model_path)
+    precision = {"half": True} if half else {"int8": True, "data": CALIB_DATA}
+    # dynamic=True keeps batches smaller than MAX_BATCH working (and lets OpenVINO accept any batch size)
+    if export_format == "engine":
+        return model.export(format="engine", imgsz=640, workspace=4, batch=MAX_BATCH, dynamic=True, **precision)
+    return model.export(format="openvino", imgsz=640, batch=MAX_BATCH, dynamic=True, **precision)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the YOLO models to INT8 (or FP16) inference engines.")
+    parser.add_argument(
+        "--format",
+        choices=["engine", "openvino"],
+        default="engine" if torch.cuda.is_available() else "openvino",
+        help="TensorRT 'engine' for NVIDIA GPUs, 'openvino' for CPU-only hosts.",
+    )
+    parser.add_argument(
+        "--half",
+        action="store_true",
+        help="Export FP16 instead of INT8. Often as fast as INT8 on consumer/Jetson GPUs and needs no calibration.",
+    )
+    args = parser.parse_args()
+
+    for model_path in MODEL_PATHS:
+        exported_path = export_model(model_path, args.format, args.half)
+        print(f"Exported {model_path} -> {exported_path}")
+
+
+if __name__ == "__main__":
+    main()
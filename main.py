@@ -1,8 +1,13 @@
-import io, os, logging
-from typing import Dict, List
-from collections import Counter
-
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import os, logging, asyncio, time
+from typing import BinaryIO, Dict, List, Tuple
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import torch
+from fastapi import Depends, FastAPI, HTTPException, Request, UploadFile, File
+from fastapi.responses import ORJSONResponse
 from PIL import Image
 from ultralytics import YOLO
 from contextlib import asynccontextmanager
@@ -11,10 +16,99 @@ from contextlib import asynccontextmanager
 logger = logging.getLogger(__name__)
 
 conf_thresh = 0.5
+imgsz = 640 # production input size
+warmup_runs = 3
+# Predictor settings, applied when warmup creates each model's predictor and reused by run_models.
+# Per-image logging and result saving/plotting are disabled, and imgsz is fixed to skip shape resolution.
+# rect=False letterboxes every image to the full imgsz square, so the only varying input dimension is
+# the batch size (which warmup covers) and cuDNN autotuning never runs on a live request.
+predict_args = {"conf": conf_thresh, "imgsz": imgsz, "rect": False, "verbose": False, "save": False, "show": False}
+
+# Largest accepted upload; bigger requests are rejected with 413 instead of being buffered
+max_upload_bytes = 10 * 1024 * 1024
+# Allowance for the multipart boundaries and headers around the file in the request body
+multipart_overhead_bytes = 64 * 1024
+
+# Keys accepted by the 'models' query parameter
+model_keys = frozenset({"flower", "coco"})
+
+# Micro-batching settings: requests arriving within max_wait_ms of each other share one model call.
+# Exported engines are built for at most MAX_BATCH images (export_models.py); keep max_batch_size <= MAX_BATCH
+# and re-export after raising it.
+max_batch_size = 16
+max_batch_wait_ms = 10
+
+
+def resolve_model_path(pt_path: str) -> str:
+    """
+    Return the exported INT8 engine for a checkpoint if export_models.py has been run,
+    otherwise fall back to the original PyTorch checkpoint.
+    """
+    stem, _ = os.path.splitext(pt_path)
+    if torch.cuda.is_available():
+        candidates = [f"{stem}.engine"]
+    else:
+        candidates = [f"{stem}_int8_openvino_model", f"{stem}_openvino_model"]
+    return next((candidate for candidate in candidates if os.path.exists(candidate)), pt_path)
+
+
+@dataclass(frozen=True, slots=True)
+class Models:
+    """ The loaded detection models and their startup-time settings, stored on app.state.models."""
+    flower: YOLO
+    coco: YOLO
+    # Class names indexed by class id, cached at startup (model.names is a static dict)
+    flower_names: List[str]
+    coco_names: List[str]
+    # One CUDA stream per model so both forward passes can be in flight on the GPU at the same time
+    streams: Tuple[torch.cuda.Stream, torch.cuda.Stream] | None = None
+
+
+def warmup_model(model: YOLO, half: bool):
+    """
+    Run a few dummy inferences at the production input size so CUDA context creation, cuDNN
+    autotuning and predictor setup happen at startup instead of on the first real request.
+    This also creates the model's predictor (with predict_args), which run_models relies on.
+    On GPU every batch size the BatchInferencer can produce is run once as well, since cuDNN
+    autotunes each new input shape.
+    """
+    dummy = Image.new("RGB", (imgsz, imgsz))
+    for i in range(warmup_runs):
+        start = time.perf_counter()
+        model.predict(dummy, stream=False, half=half, **predict_args)
+        logger.info(f"Warmup pass {i + 1}/{warmup_runs} for {model.model_name} took {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    if torch.cuda.is_available():
+        start = time.perf_counter()
+        for batch_size in range(2, max_batch_size + 1):
+            model.predict([dummy] * batch_size, stream=False, half=half, **predict_args)
+        logger.info(f"Warmup of batch sizes 2-{max_batch_size} for {model.model_name} took {(time.perf_counter() - start) * 1000:.1f} ms")
+
+
+def load_model(pt_path: str, device: str, half: bool) -> YOLO:
+    """
+    Load and warm up the exported engine for a checkpoint (see resolve_model_path). If the engine
+    cannot be loaded or run on this host (e.g. the TensorRT/OpenVINO runtime is not installed in the
+    container), fall back to the PyTorch checkpoint instead of leaving the app without models.
+    """
+    model_path = resolve_model_path(pt_path)
+    if model_path != pt_path:
+        try:
+            model = YOLO(model_path)
+            warmup_model(model, half)
+            logger.info(f"YOLO model loaded successfully from: {model_path}")
+            return model
+        except Exception as e:
+            logger.warning(f"Could not use exported model {model_path}, falling back to {pt_path}. Reason: {e}")
+
+    model = YOLO(pt_path)
+    model.to(device).eval()
+    if half:
+        model.model.half()
+    warmup_model(model, half)
+    logger.info(f"YOLO model loaded successfully from: {pt_path}")
+    return model
 
-# Global variable to store the loaded model
-model_flower: YOLO = None
-model_coco_yolo8: YOLO = None
 
 # --- Lifespan Context Manager ---
 @asynccontextmanager
@@ -23,9 +117,11 @@ async def lifespan(app: FastAPI):
     Context manager for managing the lifespan of the FastAPI application.
     Loads the YOLO model on startup and performs cleanup on shutdown.
     """
-    global model_flower
-    global model_coco_yolo8
+    app.state.models = None
+    app.state.batcher = None
+    app.state.image_executor = None
     model_path = os.path.join(os.path.dirname(__file__), "./custom_model/best.pt")
+    default_model_path = os.path.join(os.path.dirname(__file__), "./yolov8s.pt")
     try:
 
         #Configure Logging to File
@@ -51,102 +147,380 @@ async def lifespan(app: FastAPI):
         # Add the file handler to the logger
         logger.addHandler(file_handler)
 
-        model_flower = YOLO(model_path)
-        model_coco_yolo8 = YOLO("yolov8s.pt")
-        logger.info(f"YOLO model loaded successfully from: {model_path} and default model loaded.")
-        logger.info(f"Custom model device: {next(model_flower.parameters()).device}")
-        logger.info(f"Default model device: {next(model_coco_yolo8.parameters()).device}")
+        if torch.cuda.is_available():
+            # Inputs are always padded to imgsz (rect=False) and warmup runs every batch size, so let cuDNN
+            # benchmark and pick the fastest conv algorithms once per shape at startup
+            torch.backends.cudnn.benchmark = True
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        # Older GPUs (e.g. Pascal) have no tensor cores and see no speedup from FP16
+        use_half = torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 7
+
+        model_flower = load_model(model_path, device, use_half)
+        model_coco_yolo8 = load_model(default_model_path, device, use_half)
+        # Exported engines are not torch modules, so 'device' is None for them (placement is fixed at export time)
+        logger.info(f"Custom model device: {model_flower.device}")
+        logger.info(f"Default model device: {model_coco_yolo8.device}")
+        # Exported engines keep the precision they were built with; the per-model setting is predictor.model.fp16
+        logger.info(f"FP16 inference enabled for .pt checkpoints: {use_half}")
+
+        models = Models(
+            flower=model_flower,
+            coco=model_coco_yolo8,
+            flower_names=[model_flower.names[i] for i in range(len(model_flower.names))],
+            coco_names=[model_coco_yolo8.names[i] for i in range(len(model_coco_yolo8.names))],
+            streams=(torch.cuda.Stream(), torch.cuda.Stream()) if torch.cuda.is_available() else None,
+        )
+
+        app.state.models = models
+        app.state.image_executor = ThreadPoolExecutor(max_workers=os.cpu_count(), thread_name_prefix="image-decode")
+        app.state.batcher = BatchInferencer(models)
+        app.state.batcher.start()
 
     except Exception as e:
-        logger.error(f"ERROR: Could not load YOLO model from {model_path} or default model. Reason: {e}")
-        model_flower = None
-        model_coco_yolo8 = None
+        logger.error(f"ERROR: Could not load YOLO model from {model_path} or default model from {default_model_path}. Reason: {e}")
+        app.state.models = None
+        app.state.batcher = None
+        app.state.image_executor = None
 
     yield # Application startup is complete, and the application can now receive requests.
 
-    model_flower = None
-    model_coco_yolo8 = None
+    if app.state.batcher is not None:
+        await app.state.batcher.stop()
+    if app.state.image_executor is not None:
+        app.state.image_executor.shutdown(wait=False)
+    app.state.models = None
+    app.state.batcher = None
+    app.state.image_executor = None
     logger.info("FastAPI application shutting down.")
 
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
 
+class LimitUploadSizeMiddleware:
+    """
+    ASGI middleware capping the request body size while it streams in, before the multipart body is
+    spooled to memory/disk. Requests announcing a larger Content-Length are rejected up front; for
+    chunked uploads without the header, the body is counted as it is received and parsing is aborted
+    with a 413 as soon as the limit is crossed.
+    """
 
-async def detect_and_count_objects(img_contents: bytes) -> Dict[str, str] | Dict[str, List[Dict[str, str | int]]]:
-    """ Detect objects in the provided image bytes and count occurrences of each object class."""
-    if model_coco_yolo8 is None or model_flower is None:
+    def __init__(self, app, max_bytes: int, max_file_bytes: int | None = None):
+        """
+        max_bytes is the enforced limit on the whole request body; max_file_bytes is the file size limit
+        reported to clients (defaults to max_bytes), since the body also carries multipart overhead.
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes if max_file_bytes is not None else max_bytes
+
+    def too_large(self) -> HTTPException:
+        return HTTPException(status_code=413, detail=f"File too large. Maximum upload size is {self.max_file_bytes} bytes.")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            error = self.too_large()
+            response = ORJSONResponse(status_code=error.status_code, content={"detail": error.detail})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside body parsing; FastAPI re-raises HTTPExceptions, which become the 413 response
+                    raise self.too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(
+    LimitUploadSizeMiddleware,
+    max_bytes=max_upload_bytes + multipart_overhead_bytes,
+    max_file_bytes=max_upload_bytes,
+)
+
+
+def get_models(request: Request) -> Models:
+    """ FastAPI dependency returning the models loaded at startup."""
+    models = request.app.state.models
+    if models is None:
         raise HTTPException(status_code=500, detail="Object detection models are not loaded. Server might be misconfigured.")
+    return models
 
-    img_rgb = Image.open(io.BytesIO(img_contents))
 
-    # Perform inference on the image
-    # 'results_flower' will be a list of Results objects (one per image if you pass a list of images)
-    results_flower = model_flower(img_rgb, conf=conf_thresh)
-    results_yolo8 = model_coco_yolo8(img_rgb, conf=conf_thresh)
+def get_batcher(request: Request) -> "BatchInferencer":
+    """ FastAPI dependency returning the request batcher started at startup."""
+    batcher = request.app.state.batcher
+    if batcher is None:
+        raise HTTPException(status_code=500, detail="Object detection models are not loaded. Server might be misconfigured.")
+    return batcher
 
-    # Process results_flower for the first (and only) image
-    if not results_flower and not results_yolo8:
-        logger.info("No detections found.")
-        return {"objects": "No detections found."}
 
-    count_flowers = Counter()
-    count_coco_objects = Counter()
-    if results_flower:
-        result = results_flower[0] # Get the Results object for the current image
+def get_image_executor(request: Request) -> ThreadPoolExecutor | None:
+    """ FastAPI dependency returning the shared image decode pool (None falls back to the default executor)."""
+    return request.app.state.image_executor
+
+
+async def run_in_image_executor(image_executor: ThreadPoolExecutor | None, func, *args):
+    """ Run blocking image work in the shared pool (or the default executor if it is not set up)."""
+    return await asyncio.get_running_loop().run_in_executor(image_executor, func, *args)
+
 
-        # Extract detected class IDs and their names
-        detected_class_ids = result.boxes.cls.tolist() # Convert tensor to list
-        class_names = model_flower.names # Get the mapping from class ID to class name (e.g., {0: 'person', 1: 'bicycle', ...})
+def decode_image(fp: BinaryIO) -> tuple:
+    """
+    Fully decode the image file into an RGB PIL image. load() raises on truncated or corrupt data,
+    so this doubles as validation and the decoded image can be handed straight to the models.
+    Returns (image, original format, original size); the image itself may have been downscaled.
+    """
+    fp.seek(0)
+    image = Image.open(fp)
+    image_format, image_size = image.format, image.size
+    # For JPEGs, let libjpeg(-turbo) decode straight to the smallest 1/2, 1/4 or 1/8 scale that is still
+    # at least imgsz on both sides; the models letterbox to imgsz anyway. No-op for other formats.
+    image.draft("RGB", (imgsz, imgsz))
+    image.load()  # also keeps the lazy decoder from being triggered by both model threads at once
+    # Same conversion ultralytics applies to PIL inputs; resizing (reduce()) also fails on modes like I;16
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    # Downscale (keeping the aspect ratio) to fit imgsz once here, on the decode pool, so the letterbox
+    # in preprocessing only pads a small image. No-op for images already within imgsz.
+    image.thumbnail((imgsz, imgsz), Image.Resampling.BILINEAR)
+    return image, image_format, image_size
+
+
+def preprocess_images(models: Models, images: List[Image.Image]) -> tuple:
+    """
+    Letterbox, normalize and upload the images once, so both models can share the same input tensor
+    instead of each predictor repeating the work. Both models use the same imgsz and stride.
+    Returns the (batch tensor, original images) pair expected by the predictors.
+    """
+    # Same conversion ultralytics applies to PIL inputs: RGB (from decode_image) -> BGR HWC numpy arrays
+    orig_imgs = [np.asarray(img)[:, :, ::-1] for img in images]
+    with torch.inference_mode():
+        batch = models.flower.predictor.preprocess(orig_imgs)
+    return batch, orig_imgs
+
+
+def run_model_on_stream(model: YOLO, batch: torch.Tensor, orig_imgs: List[np.ndarray], stream: torch.cuda.Stream | None):
+    """
+    Run a single model's forward pass and NMS on an already preprocessed batch, issuing its CUDA
+    kernels on the given stream (if any). The predictor was set up with predict_args during warmup.
+    The stream is synchronized here, in the worker thread, so the event loop never blocks on the GPU.
+    """
+    predictor = model.predictor
+    # postprocess reads the image paths from predictor.batch; uploads have none
+    predictor.batch = ([""] * len(orig_imgs), orig_imgs, [""] * len(orig_imgs))
+    with torch.cuda.stream(stream) if stream is not None else nullcontext(), torch.inference_mode():
+        if stream is not None:
+            stream.wait_stream(torch.cuda.default_stream()) # the batch was uploaded on the default stream
+        batch = batch.half() if predictor.model.fp16 else batch.float() # no-op unless the models differ in precision
+        preds = predictor.inference(batch)
+        results = predictor.postprocess(preds, batch, orig_imgs)
+        if stream is not None:
+            stream.synchronize()
+        return results
+
+
+async def run_models(models: Models, images: List[Image.Image], wanted: List[set]) -> tuple:
+    """
+    Preprocess the images once, then dispatch the requested models concurrently on the shared tensor,
+    each from a worker thread on its own CUDA stream, so the second model's kernels overlap with the
+    first instead of waiting for it. 'wanted' holds the set of model keys requested for each image;
+    a model only runs on the images that asked for it and is skipped entirely if none did.
+    Returns per-model lists aligned with 'images', with None where the model was not requested.
+    """
+    batch, orig_imgs = await asyncio.to_thread(preprocess_images, models, images)
+    flower_stream, coco_stream = models.streams if models.streams is not None else (None, None)
+
+    per_model_results = []
+    jobs = []
+    for key, model, stream in (("flower", models.flower, flower_stream), ("coco", models.coco, coco_stream)):
+        indices = [i for i, wanted_models in enumerate(wanted) if key in wanted_models]
+        results = [None] * len(images)
+        per_model_results.append(results)
+        if not indices:
+            continue
+        if len(indices) == len(images):
+            model_batch, model_imgs = batch, orig_imgs
+        else:
+            model_batch, model_imgs = batch[indices], [orig_imgs[i] for i in indices]
+        jobs.append((indices, results, asyncio.to_thread(run_model_on_stream, model, model_batch, model_imgs, stream)))
+
+    outputs = await asyncio.gather(*(job for _, _, job in jobs))
+
+    for (indices, results, _), output in zip(jobs, outputs):
+        for i, result in zip(indices, output):
+            results[i] = result
+    results_flower, results_yolo8 = per_model_results
+    return results_flower, results_yolo8
+
+
+class BatchInferencer:
+    """
+    Coalesces images from concurrent requests into a single batched call per model.
+    A background task pulls pending images off the queue until either max_batch images are
+    collected or max_wait_ms has passed, runs both models once on the whole batch and hands
+    each request back its own results.
+    """
 
-        # Count objects by class label
-        for class_id in detected_class_ids:
-            class_name = class_names[int(class_id)]
-            count_flowers[class_name] += 1
+    def __init__(self, models: Models, max_batch: int = max_batch_size, max_wait_ms: float = max_batch_wait_ms):
+        self.models = models
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.worker: asyncio.Task | None = None
+
+    def start(self):
+        self.worker = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.worker is not None:
+            self.worker.cancel()
+            try:
+                await self.worker
+            except asyncio.CancelledError:
+                pass
+            self.worker = None
+
+        # Fail anything still waiting so no request hangs during shutdown
+        pending = []
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        self.fail_batch(pending, HTTPException(status_code=503, detail="Server is shutting down."))
+
+    @staticmethod
+    def fail_batch(batch: list, exc: Exception):
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(exc)
+
+    async def submit(self, img, wanted: set) -> tuple:
+        """ Queue an image for the requested models and wait for its (results_flower, results_yolo8) pair."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(((img, wanted), future))
+        return await future
+
+    async def collect_batch(self) -> list:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        try:
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # These requests are already off the queue, so stop() cannot fail them; do it here
+            self.fail_batch(batch, HTTPException(status_code=503, detail="Server is shutting down."))
+            raise
+        return batch
+
+    async def run(self):
+        while True:
+            batch = await self.collect_batch()
+            images = [img for (img, _), _ in batch]
+            wanted = [wanted_models for (_, wanted_models), _ in batch]
+            try:
+                results_flower, results_yolo8 = await run_models(self.models, images, wanted)
+            except asyncio.CancelledError:
+                self.fail_batch(batch, HTTPException(status_code=503, detail="Server is shutting down."))
+                raise
+            except Exception as e:
+                logger.error(f"Batched inference failed for {len(batch)} image(s). Reason: {e}")
+                self.fail_batch(batch, e)
+                continue
+
+            # Results come back in input order; wrap each in a list to match a single-image model call
+            # (an empty list for a model that was not requested)
+            for (_, future), result_flower, result_yolo8 in zip(batch, results_flower, results_yolo8):
+                if not future.done():  # the client may have disconnected meanwhile
+                    future.set_result((
+                        [result_flower] if result_flower is not None else [],
+                        [result_yolo8] if result_yolo8 is not None else [],
+                    ))
+
+
+
+def count_objects(results: list, class_names: List[str]) -> List[Dict[str, str | int]]:
+    """
+    Count detections per class across the Results objects, vectorized with numpy, and build the
+    response entries ({"object_name": ..., "object_count": ...}) for the detected classes.
+    """
+    # len() only reads the tensor shape, so empty results skip the device-to-host copy entirely
+    class_tensors = [result.boxes.cls for result in results if result.boxes is not None and len(result.boxes)]
+    if not class_tensors:
+        return []
 
-    if results_yolo8:
-        result = results_yolo8[0]
+    # One bulk device-to-host copy of the class ids, then count them all at once
+    class_ids = torch.cat(class_tensors).to(torch.int64).cpu().numpy()
+    counts = np.bincount(class_ids, minlength=len(class_names))
+    return [{"object_name": class_names[i], "object_count": int(counts[i])} for i in counts.nonzero()[0]]
 
-        # Extract detected class IDs and their names
-        detected_class_ids = result.boxes.cls.tolist() # Convert tensor to list
-        class_names = model_coco_yolo8.names # Get the mapping from class ID to class name (e.g., {0: 'person', 1: 'bicycle', ...})
 
-        # Count objects by class label
-        for class_id in detected_class_ids:
-            class_name = class_names[int(class_id)]
-            count_coco_objects[class_name] += 1
+async def detect_and_count_objects(img_rgb: Image.Image, models: Models, batcher: BatchInferencer, wanted: set = model_keys) -> Dict[str, str] | Dict[str, List[Dict[str, str | int]]]:
+    """
+    Detect objects in the provided decoded image and count occurrences of each object class.
+    Only the models named in 'wanted' ("flower" and/or "coco") are run.
+    """
+    # Perform inference on the image, batched together with any other in-flight requests
+    # 'results_flower' will be a list holding the Results object for this image
+    results_flower, results_yolo8 = await batcher.submit(img_rgb, wanted)
+
+    # Process results_flower for the first (and only) image
+    if not results_flower and not results_yolo8:
+        logger.info("No detections found.")
+        return {"objects": "No detections found."}
 
-    data_flower_obj = [{"object_name": name, "object_count": count} for name, count in count_flowers.items()]
-    data_coco_obj = [{"object_name": name, "object_count": count} for name, count in count_coco_objects.items()]
-    total_data = data_flower_obj + data_coco_obj
+    # Count objects by class label
+    # The names lists map class ID to class name (e.g., ['person', 'bicycle', ...])
+    total_data = count_objects(results_flower, models.flower_names) + count_objects(results_yolo8, models.coco_names)
 
     return {"objects": total_data}
 
 
-async def verify_image(file: File = File(...)):
+async def verify_image(file: File = File(...), image_executor: ThreadPoolExecutor | None = None):
     try:
         # Validate file type provided by the client
         # For more robust validation might involve reading magic bytes.
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="Invalid file type. Only image files are allowed.")
 
-        # Read the file content into memory
-        contents = await file.read()
+        # The middleware bounds the whole request body; this enforces the exact limit on the file itself
+        # (without reading it into memory)
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
+        file.file.seek(0)
+        if size > max_upload_bytes:
+            raise HTTPException(status_code=413, detail=f"File too large. Maximum upload size is {max_upload_bytes} bytes.")
 
         # Basic image validation using Pillow
         try:
-            image = Image.open(io.BytesIO(contents))
-            image.verify()  # Verify if it's a valid image
-            # If verify() passes, the image is likely valid.
+            # Decode straight from the upload's spooled file (memory or temp file), no bytes copy / BytesIO
+            image, image_format, image_size = await run_in_image_executor(image_executor, decode_image, file.file)
+            # If the full decode passes, the image is valid.
 
-            logger.info(f"Received image: {file.filename}, Format: {image.format}, Size: {image.size}")
+            logger.info(f"Received image: {file.filename}, Format: {image_format}, Size: {image_size}")
         except Exception as e:
             logger.error(f"Error processing image {file.filename}: {e}")
             # If the image is not valid, raise an HTTPException
             raise HTTPException(status_code=400, detail=f"Could not process image: {e}")
 
-        # 4. Return a success response
-        return contents
+        # 4. Return the decoded image
+        return image
 
     except HTTPException as e:
         # Re-raise HTTPException to be handled by FastAPI's default exception handler
@@ -156,15 +530,33 @@ async def verify_image(file: File = File(...)):
         raise HTTPException(status_code=500, detail=f"An internal server error occurred: {e}")
 
 
+def parse_models(models: str) -> set:
+    """ Parse the comma-separated 'models' query parameter ("all", "flower", "coco") into a set of model keys."""
+    names = {name.strip().lower() for name in models.split(",") if name.strip()}
+    if "all" in names:
+        return set(model_keys)
+    if not names or not names <= model_keys:
+        raise HTTPException(status_code=400, detail=f"Invalid models '{models}'. Use 'all' or a comma-separated subset of {sorted(model_keys)}.")
+    return names
+
+
 @app.post("/detect-objects")
-async def detect_objects(file: UploadFile = File(...)):
+async def detect_objects(
+    file: UploadFile = File(...),
+    models: str = "all",
+    loaded_models: Models = Depends(get_models),
+    batcher: BatchInferencer = Depends(get_batcher),
+    image_executor: ThreadPoolExecutor | None = Depends(get_image_executor),
+):
     """
-    Upload a file and check the object name and object count in return
+    Upload a file and check the object name and object count in return.
+    Use the 'models' query parameter (e.g. ?models=coco) to run only some of the models.
     """
     try:
-        img_content = await verify_image(file=file)
+        wanted = parse_models(models)
+        image = await verify_image(file=file, image_executor=image_executor)
 
-        return await detect_and_count_objects(img_content)
+        return await detect_and_count_objects(image, loaded_models, batcher, wanted)
 
     except HTTPException:
         raise